@@ -3,28 +3,71 @@ Script to populate the database with fake historical data for testing.
 Adds 2 years of random habit completion data.
 """
 from datetime import date, timedelta
-import random
-from database import get_db_connection
-from models import get_all_habits
+import sqlite3
+import numpy as np
+from database import get_db_connection, write_txn, init_db, close_db
 
-def add_fake_historical_data(days_back=730):
+
+def generate_completions(rng, days_back, base_rate):
+    """
+    Simulate which days a habit was completed, oldest day first.
+    Pure NumPy with no database access, so it can be reused or swapped for a faster kernel.
+
+    Args:
+        rng: numpy.random.Generator to draw from
+        days_back: Number of days to simulate
+        base_rate: Starting completion probability (0-1)
+
+    Returns:
+        Boolean array of length days_back (index 0 = days_back days ago)
+    """
+    days_ago = np.arange(days_back, 0, -1)
+
+    # Add dramatic variance - rate can swing by up to 30% every 30 days, clamped after
+    # each swing. That walk is sequential, but it only has one step per 30 days.
+    is_change_day = days_ago % 30 == 0
+    rates = [base_rate]
+    for change in rng.uniform(-0.3, 0.3, int(is_change_day.sum())):
+        rates.append(max(0.1, min(0.95, rates[-1] + change)))
+
+    # Rate in effect on each day: the one set by the latest change so far
+    current_rate = np.array(rates)[np.cumsum(is_change_day)]
+
+    # Daily small variations
+    daily_variation = rng.uniform(-0.05, 0.05, days_back)
+    daily_rate = np.clip(current_rate + daily_variation, 0.0, 1.0)
+
+    # Randomly decide which days were completed
+    return rng.random(days_back) < daily_rate
+
+
+def add_fake_historical_data(days_back=730, seed=None):
     """
     Add fake completion data for all habits going back N days with dramatic variance.
 
     Args:
         days_back: Number of days of history to generate (default 730 = ~2 years)
+        seed: Optional random seed for reproducible data
     """
-    habits = get_all_habits()
+    conn = get_db_connection()
+
+    # Every user's habits (models.get_all_habits is per user)
+    habits = conn.execute("SELECT habit_id, habit_name FROM habits ORDER BY habit_id").fetchall()
 
     if not habits:
         print("No habits found in database")
         return
 
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Bulk-load settings: this is a throwaway dev script, so trade durability for speed
+    conn.execute("PRAGMA synchronous=OFF")
+    conn.execute("PRAGMA temp_store=MEMORY")
 
     today = date.today()
-    events_added = 0
+    rng = np.random.default_rng(seed)
+    rows = []
+
+    # Every habit covers the same date range, so build it once (oldest day first)
+    log_date_strs = [(today - timedelta(days=d)).isoformat() for d in range(days_back, 0, -1)]
 
     print(f"Adding {days_back} days of fake data for {len(habits)} habits...")
 
@@ -33,57 +76,64 @@ def add_fake_historical_data(days_back=730):
         habit_name = habit['habit_name']
 
         # Start with a random completion rate
-        base_rate = random.uniform(0.4, 0.8)
-        current_rate = base_rate
+        base_rate = rng.uniform(0.4, 0.8)
 
         print(f"  Habit '{habit_name}' (ID {habit_id}): Starting at {base_rate*100:.0f}% completion rate with high variance")
 
-        # Generate events for each day with dramatic swings
-        for days_ago in range(days_back, 0, -1):
-            log_date = today - timedelta(days=days_ago)
-            log_date_str = log_date.strftime('%Y-%m-%d')
-
-            # Add dramatic variance - rate can swing by up to 30% each period
-            if days_ago % 30 == 0:  # Every 30 days, make a significant change
-                change = random.uniform(-0.3, 0.3)
-                current_rate = max(0.1, min(0.95, current_rate + change))
-
-            # Daily small variations
-            daily_variation = random.uniform(-0.05, 0.05)
-            daily_rate = max(0.0, min(1.0, current_rate + daily_variation))
+        is_completed = generate_completions(rng, days_back, base_rate)
+        event_types = np.where(is_completed, 'mark_complete', 'mark_incomplete').tolist()
 
-            # Randomly decide if this day was completed
-            is_completed = random.random() < daily_rate
+        rows.extend((habit_id, log_date_str, event_type)
+                    for log_date_str, event_type in zip(log_date_strs, event_types))
 
-            event_type = 'mark_complete' if is_completed else 'mark_incomplete'
+    try:
+        # Insert every event in one batch and one transaction
+        with write_txn() as conn:
+            conn.executemany("""
+                INSERT INTO habit_events (habit_id, log_date, event_type)
+                VALUES (?, ?, ?)
+            """, rows)
+        events_added = len(rows)
 
-            try:
-                cursor.execute("""
-                    INSERT INTO habit_events (habit_id, log_date, event_type)
-                    VALUES (?, ?, ?)
-                """, (habit_id, log_date_str, event_type))
-                events_added += 1
-
-            except Exception as e:
-                print(f"    Error adding event for {log_date_str}: {e}")
-
-        conn.commit()
-
-    conn.close()
+    except sqlite3.Error as e:
+        print(f"Error adding events: {e}")
+        return
 
     print(f"\nSuccessfully added {events_added} events!")
     print(f"Total days per habit: {days_back}")
     print(f"Total habits: {len(habits)}")
 
 if __name__ == '__main__':
+    # Bring the schema up to date first (habit_day_status, triggers, columns),
+    # since the reset below relies on it
+    init_db()
+
     # Clear existing events first (optional - comment out if you want to keep existing data)
     print("Clearing existing habit events...")
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM habit_events WHERE event_type IN ('mark_complete', 'mark_incomplete')")
-    conn.commit()
-    conn.close()
+    with write_txn() as conn:
+        cursor = conn.cursor()
+
+        # Drop the habit_events indexes for the bulk reload; init_db() rebuilds them at the end
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'index' AND tbl_name = 'habit_events' AND sql IS NOT NULL")
+        for row in cursor.fetchall():
+            cursor.execute(f"DROP INDEX IF EXISTS {row['name']}")
+
+        # An unfiltered DELETE lets SQLite truncate the table instead of deleting row by row,
+        # so set aside the few habit_created/habit_deleted events and put them back afterwards
+        cursor.execute("""
+            CREATE TEMP TABLE kept_events AS
+            SELECT * FROM habit_events WHERE event_type NOT IN ('mark_complete', 'mark_incomplete')
+        """)
+        cursor.execute("DELETE FROM habit_events")
+        cursor.execute("DELETE FROM habit_day_status")
+        cursor.execute("INSERT INTO habit_events SELECT * FROM kept_events")
+        cursor.execute("DROP TABLE kept_events")
     print("Existing events cleared.\n")
 
-    # Add 2 years of fake data
-    add_fake_historical_data(days_back=730)
+    try:
+        # Add 2 years of fake data
+        add_fake_historical_data(days_back=730)
+    finally:
+        # Rebuild the indexes dropped above, even if loading failed
+        init_db()
+        close_db()
@@ -2,31 +2,56 @@
 Century Tracker - Flask application entry point.
 Web interface for habit tracking with rolling 100-day window.
 """
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, session, g
+from flask_caching import Cache
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user
 from datetime import date, datetime
+import logging
 import os
-from database import init_db
+from database import init_db, reset_request_db
 from models import (
-    get_habit_stats_all,
+    get_habit_stats,
     create_habit,
     mark_habit_complete,
     mark_habit_incomplete,
     get_habit_date_status,
     delete_habit,
     get_habit_100day_history,
+    day_complete,
+    format_history,
+    get_homepage_snapshot,
+    get_habits_version,
     get_habit_trend_data,
     rename_habit,
     update_habit_order,
-    verify_habit_ownership
+    verify_habits_ownership
 )
 from auth import User, create_user, get_user_by_username, get_user_by_id, verify_password
 
 
 app = Flask(__name__)
 
+# Configure logging once; model-level debug messages only show under FLASK_DEBUG=1
+logging.basicConfig(
+    level=logging.DEBUG if os.environ.get('FLASK_DEBUG') == '1' else logging.INFO,
+    format='%(asctime)s %(levelname)s %(name)s: %(message)s'
+)
+
 # Secret key for session management (CRITICAL for production)
-app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'dev-secret-key-change-in-production')
+# Must be set in the environment; only the FLASK_DEBUG=1 dev server falls back to a dev key
+secret_key = os.environ.get('SECRET_KEY')
+if not secret_key:
+    if os.environ.get('FLASK_DEBUG') != '1':
+        raise RuntimeError('SECRET_KEY environment variable must be set (or set FLASK_DEBUG=1 for local development)')
+    secret_key = 'dev-secret-key-change-in-production'
+app.config['SECRET_KEY'] = secret_key
+
+# Only re-sign and re-send the session cookie when the session actually changes
+app.config['SESSION_REFRESH_EACH_REQUEST'] = False
+app.config['SESSION_COOKIE_SAMESITE'] = 'Lax'
+
+# In-process cache for rendered pages (per worker)
+cache = Cache(app, config={'CACHE_TYPE': 'SimpleCache', 'CACHE_DEFAULT_TIMEOUT': 300})
 
 # Flask-Login setup
 login_manager = LoginManager()
@@ -39,6 +64,24 @@ def load_user(user_id):
     """Required by Flask-Login to reload user from session"""
     return get_user_by_id(int(user_id))
 
+@app.template_filter('bit')
+def bit_filter(mask: int, index: int) -> bool:
+    """Jinja filter: return bit `index` of a history bitmask (True = completed that day)."""
+    return day_complete(mask, index)
+
+@app.template_filter('history_bits')
+def history_bits_filter(mask: int) -> str:
+    """Jinja filter: render a 100-day history bitmask as a '0'/'1' string, newest first."""
+    return format_history(mask)
+
+# Each thread keeps its database connection; just clear any transaction a request left open
+app.teardown_appcontext(reset_request_db)
+
+@app.before_request
+def set_request_date():
+    """Read today's date once per request; routes pass g.today to the model functions."""
+    g.today = date.today()
+
 # Initialize database on startup
 with app.app_context():
     init_db()
@@ -111,9 +154,9 @@ def login():
             flash('Please enter both username and password.', 'error')
             return render_template('login.html')
 
-        # Verify credentials
+        # Verify credentials (always runs a hash check, even for unknown usernames)
         user = get_user_by_username(username)
-        if user and verify_password(user, password):
+        if verify_password(user, password):
             login_user(user)
 
             # Redirect to 'next' page if provided, otherwise home
@@ -138,17 +181,20 @@ def logout():
 
 # ==================== Habit Routes ====================
 
+def index_cache_key() -> str:
+    """Cache key for the home page: changes with the user, the date, and any habit or event change."""
+    return f"index:{current_user.id}:{g.today}:{get_habits_version(current_user.id)}"
+
+
 @app.route('/')
 @login_required
+@cache.cached(make_cache_key=index_cache_key, unless=lambda: '_flashes' in session)
 def index():
     """Home page - display all habits with their 100-day counts."""
-    stats = get_habit_stats_all(current_user.id)
-    today = date.today()
-
-    # For each habit, check if it's already marked complete today and get daily history
+    # Counts and daily history bitmasks (bit 0 = today) for every habit in one query
+    stats = get_homepage_snapshot(current_user.id, g.today)
     for stat in stats:
-        stat['completed_today'] = get_habit_date_status(stat['habit_id'], today)
-        stat['history'] = get_habit_100day_history(stat['habit_id'], today)
+        stat['completed_today'] = day_complete(stat['history_mask'], 0)
 
     return render_template('index.html', habits=stats)
 
@@ -169,18 +215,18 @@ def add_habit():
 @login_required
 def toggle_habit(habit_id):
     """Toggle habit completion for today."""
-    # Verify user owns this habit
-    if not verify_habit_ownership(habit_id, current_user.id):
-        flash('You do not have access to that habit.', 'error')
-        return redirect(url_for('index'))
-
-    today = date.today()
+    today = g.today
     is_complete = get_habit_date_status(habit_id, today)
 
+    # The mark functions only log the event if the user owns this habit
     if is_complete:
-        mark_habit_incomplete(habit_id)
+        toggled = mark_habit_incomplete(habit_id, current_user.id, today)
     else:
-        mark_habit_complete(habit_id)
+        toggled = mark_habit_complete(habit_id, current_user.id, today)
+
+    if not toggled:
+        flash('You do not have access to that habit.', 'error')
+        return redirect(url_for('index'))
 
     # Check if there's a redirect URL in the form data
     next_url = request.form.get('next')
@@ -194,10 +240,6 @@ def toggle_habit(habit_id):
 @login_required
 def toggle_habit_date(habit_id):
     """Toggle habit completion for a specific date."""
-    # Verify ownership
-    if not verify_habit_ownership(habit_id, current_user.id):
-        return jsonify({'error': 'Unauthorized'}), 403
-
     # Get date from POST data
     data = request.get_json()
     date_str = data.get('date')  # Format: YYYY-MM-DD
@@ -208,22 +250,24 @@ def toggle_habit_date(habit_id):
         return jsonify({'error': 'Invalid date format'}), 400
 
     # Check if date is within 2-year window
-    today = date.today()
+    today = g.today
     days_ago = (today - log_date).days
     if days_ago < 0 or days_ago >= 730:  # 2 years = ~730 days
         return jsonify({'error': 'Date out of range. Only the last 2 years can be edited.'}), 400
 
-    # Toggle the date
+    # Toggle the date (the mark functions only log the event if the user owns this habit)
     is_complete = get_habit_date_status(habit_id, log_date)
     if is_complete:
-        mark_habit_incomplete(habit_id, log_date)
+        toggled = mark_habit_incomplete(habit_id, current_user.id, log_date)
     else:
-        mark_habit_complete(habit_id, log_date)
+        toggled = mark_habit_complete(habit_id, current_user.id, log_date)
+
+    if not toggled:
+        return jsonify({'error': 'Unauthorized'}), 403
 
     # Get updated data
     new_status = not is_complete
-    stats = get_habit_stats_all(current_user.id)
-    habit = next((h for h in stats if h['habit_id'] == habit_id), None)
+    habit = get_habit_stats(habit_id, current_user.id, today)
 
     # Get trend period from query parameter (default 100)
     period = request.args.get('period', 100, type=int)
@@ -266,7 +310,7 @@ def toggle_habit_date(habit_id):
         'success': True,
         'new_status': new_status,
         'new_count': habit['count'] if habit else 0,
-        'updated_history': get_habit_100day_history(habit_id, today),
+        'updated_history': format_history(get_habit_100day_history(habit_id, today)),
         'trend': trend_data,
         'month_labels': month_labels
     })
@@ -276,15 +320,12 @@ def toggle_habit_date(habit_id):
 @login_required
 def habit_detail(habit_id):
     """Display habit detail page."""
-    # Verify user owns this habit
-    if not verify_habit_ownership(habit_id, current_user.id):
-        flash('You do not have access to that habit.', 'error')
-        return redirect(url_for('index'))
-
-    stats = get_habit_stats_all(current_user.id)
-    habit = next((h for h in stats if h['habit_id'] == habit_id), None)
+    # Returns None if the habit doesn't exist or belongs to another user
+    today = g.today
+    habit = get_habit_stats(habit_id, current_user.id, today)
 
     if not habit:
+        flash('You do not have access to that habit.', 'error')
         return redirect(url_for('index'))
 
     # Get trend period from query parameter (default 100)
@@ -293,7 +334,6 @@ def habit_detail(habit_id):
     if period not in [100, 200, 300, 365, 400, 500]:
         period = 100
 
-    today = date.today()
     habit['completed_today'] = get_habit_date_status(habit_id, today)
     habit['history'] = get_habit_100day_history(habit_id, today)
     habit['trend'] = get_habit_trend_data(habit_id, today, period)
@@ -340,14 +380,10 @@ def habit_detail(habit_id):
 @login_required
 def rename_habit_route(habit_id):
     """Rename a habit."""
-    # Verify user owns this habit
-    if not verify_habit_ownership(habit_id, current_user.id):
+    new_name = request.form.get('habit_name')
+    if new_name and not rename_habit(habit_id, current_user.id, new_name):
         flash('You do not have access to that habit.', 'error')
         return redirect(url_for('index'))
-
-    new_name = request.form.get('habit_name')
-    if new_name:
-        rename_habit(habit_id, new_name)
     return redirect(url_for('habit_detail', habit_id=habit_id))
 
 
@@ -355,12 +391,8 @@ def rename_habit_route(habit_id):
 @login_required
 def delete_habit_route(habit_id):
     """Delete a habit after confirmation."""
-    # Verify user owns this habit
-    if not verify_habit_ownership(habit_id, current_user.id):
+    if not delete_habit(habit_id, current_user.id):
         flash('You do not have access to that habit.', 'error')
-        return redirect(url_for('index'))
-
-    delete_habit(habit_id)
     return redirect(url_for('index'))
 
 
@@ -381,9 +413,8 @@ def reorder_habits():
         return jsonify({'error': 'Invalid habit IDs'}), 400
 
     # Verify all habits belong to current user
-    for habit_id in habit_ids:
-        if not verify_habit_ownership(habit_id, current_user.id):
-            return jsonify({'error': 'Unauthorized'}), 403
+    if not verify_habits_ownership(habit_ids, current_user.id):
+        return jsonify({'error': 'Unauthorized'}), 403
 
     success = update_habit_order(habit_ids)
 
@@ -394,4 +425,6 @@ def reorder_habits():
 
 
 if __name__ == '__main__':
-    app.run(port=5001, debug=True)
+    # Development server only; set FLASK_DEBUG=1 for the debugger and auto-reload.
+    # In production run `gunicorn app:app` (settings in gunicorn.conf.py).
+    app.run(port=5001, debug=os.environ.get('FLASK_DEBUG') == '1')
@@ -4,10 +4,31 @@ Handles user registration, login, and password management.
 """
 from typing import Optional
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+import logging
+import secrets
 import sqlite3
+from flask import g, has_app_context
 from flask_login import UserMixin
 from werkzeug.security import generate_password_hash, check_password_hash
-from database import get_db_connection
+from database import get_db_connection, in_write_txn, write_txn
+
+log = logging.getLogger(__name__)
+
+
+# Explicit hashing cost: scrypt (N=32768, r=8, p=1) takes ~50 ms per hash versus
+# ~150 ms for Werkzeug's 600k-iteration pbkdf2:sha256, and is memory-hard.
+# Existing pbkdf2 hashes still verify because the method is stored in each hash.
+PASSWORD_HASH_METHOD = 'scrypt:32768:8:1'
+
+# Password checks run on a small shared pool. hashlib releases the GIL while hashing,
+# so checks from different request threads run in parallel, and the pool caps how
+# many ~32 MB scrypt computations can be in flight at once.
+_hash_pool = ThreadPoolExecutor(max_workers=4, thread_name_prefix='password-hash')
+
+# Checked against when the username doesn't exist, so unknown-user logins take as
+# long as wrong-password logins (no timing hint about which usernames exist)
+_DUMMY_HASH = generate_password_hash(secrets.token_hex(16), method=PASSWORD_HASH_METHOD)
 
 
 class User(UserMixin):
@@ -34,36 +55,34 @@ def create_user(username: str, password: str) -> Optional[int]:
     Returns:
         user_id of the created user, or None if creation failed
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    # Hash before taking the write lock so other writers aren't kept waiting
+    password_hash = generate_password_hash(password, method=PASSWORD_HASH_METHOD)
 
+    joined = in_write_txn()
     try:
-        # Hash password using pbkdf2:sha256
-        password_hash = generate_password_hash(password, method='pbkdf2:sha256')
-
-        cursor.execute("""
-            INSERT INTO users (username, password_hash)
-            VALUES (?, ?)
-        """, (username, password_hash))
-
-        user_id = cursor.lastrowid
-        conn.commit()
-        print(f"Created user '{username}' with ID {user_id}")
+        with write_txn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                INSERT INTO users (username, password_hash)
+                VALUES (?, ?)
+            """, (username, password_hash))
+            user_id = cursor.lastrowid
+
+        log.debug("Created user %r with ID %s", username, user_id)
         return user_id
 
     except sqlite3.IntegrityError as e:
-        print(f"Error creating user (username may already exist): {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.warning("Error creating user (username may already exist): %s", e)
         return None
 
     except sqlite3.Error as e:
-        print(f"Error creating user: {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.error("Error creating user: %s", e)
         return None
 
-    finally:
-        conn.close()
-
 
 def get_user_by_username(username: str) -> Optional[User]:
     """
@@ -96,16 +115,15 @@ def get_user_by_username(username: str) -> Optional[User]:
         return None
 
     except sqlite3.Error as e:
-        print(f"Error fetching user by username: {e}")
+        log.error("Error fetching user by username: %s", e)
         return None
 
-    finally:
-        conn.close()
-
 
 def get_user_by_id(user_id: int) -> Optional[User]:
     """
     Retrieve a user by ID for Flask-Login user_loader.
+    Results are cached on flask.g so repeated lookups within one request
+    don't hit the database again.
 
     Args:
         user_id: User ID to look up
@@ -113,6 +131,10 @@ def get_user_by_id(user_id: int) -> Optional[User]:
     Returns:
         User object if found, None otherwise
     """
+    user_cache = g.setdefault('user_cache', {}) if has_app_context() else {}
+    if user_id in user_cache:
+        return user_cache[user_id]
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
@@ -124,32 +146,35 @@ def get_user_by_id(user_id: int) -> Optional[User]:
         """, (user_id,))
 
         row = cursor.fetchone()
+        user = None
         if row:
-            return User(
+            user = User(
                 user_id=row['user_id'],
                 username=row['username'],
                 password_hash=row['password_hash'],
                 date_created=row['date_created']
             )
-        return None
+        user_cache[user_id] = user
+        return user
 
     except sqlite3.Error as e:
-        print(f"Error fetching user by ID: {e}")
+        log.error("Error fetching user by ID: %s", e)
         return None
 
-    finally:
-        conn.close()
-
 
-def verify_password(user: User, password: str) -> bool:
+def verify_password(user: Optional[User], password: str) -> bool:
     """
     Verify a password against the stored hash.
+    If user is None, a dummy hash is checked instead so the response time
+    doesn't reveal whether the username exists.
 
     Args:
-        user: User object with password_hash attribute
+        user: User object with password_hash attribute, or None if no such user
         password: Plain text password to verify
 
     Returns:
         True if password matches, False otherwise
     """
-    return check_password_hash(user.password_hash, password)
+    password_hash = user.password_hash if user else _DUMMY_HASH
+    matches = _hash_pool.submit(check_password_hash, password_hash, password).result()
+    return matches and user is not None
@@ -2,43 +2,170 @@
 Database connection and schema initialization for Century Tracker.
 """
 import sqlite3
-from typing import Optional
+import threading
+from contextlib import contextmanager
+from datetime import date
+from typing import Iterator, Optional
 
 
 DATABASE_PATH = 'century_tracker.db'
 
+# Bind date objects as 'YYYY-MM-DD' text, the format log_date is stored in
+# (registered explicitly: the built-in default adapters are deprecated in Python 3.12)
+sqlite3.register_adapter(date, date.isoformat)
+
+# SQLite allows one writer at a time; queue writers in this process on a lock
+# instead of letting them hit SQLITE_BUSY and retry. Reads don't take the lock.
+_write_lock = threading.Lock()
+
+# One long-lived connection per thread, so pragmas and SQLite's page and
+# statement caches survive from one call (and one request) to the next
+_local = threading.local()
+
 
 def get_db_connection() -> sqlite3.Connection:
     """
-    Create and return a connection to the SQLite database.
+    Return this thread's connection to the SQLite database, opening it on first use.
+    The connection is reused for the life of the thread and should not be closed
+    by callers. It runs in autocommit mode: use write_txn() for writes.
+    Model functions that call each other (e.g. get_habit_stats) therefore share one
+    connection and its statement cache without having to pass it along.
 
     Returns:
         sqlite3.Connection: Database connection object
     """
-    conn = sqlite3.connect(DATABASE_PATH)
+    conn = getattr(_local, 'conn', None)
+    if conn is None:
+        conn = _connect()
+        _local.conn = conn
+    return conn
+
+
+def _connect() -> sqlite3.Connection:
+    """Open a new autocommit SQLite connection with rows accessible by column name."""
+    # Larger prepared-statement cache: the connection lives for the whole thread,
+    # so every query the app runs stays compiled after its first use
+    conn = sqlite3.connect(DATABASE_PATH, check_same_thread=False, isolation_level=None,
+                           cached_statements=256)
     conn.row_factory = sqlite3.Row  # Enable column access by name
+
+    # WAL lets readers keep going while a write is in progress. With synchronous=NORMAL a
+    # commit is an append to the WAL and fsyncs only happen at checkpoints: commits survive
+    # an app crash, though the last few may be lost on power failure. journal_mode is stored
+    # in the file (a no-op once set) but is applied here so any database file gets it.
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.execute("PRAGMA temp_store=MEMORY")
+    conn.execute("PRAGMA mmap_size=268435456")  # 256 MB
+    conn.execute("PRAGMA cache_size=-20000")  # ~20 MB page cache
     return conn
 
 
+def get_tuple_cursor(conn: sqlite3.Connection) -> sqlite3.Cursor:
+    """
+    Create a cursor that returns plain tuples instead of sqlite3.Row objects.
+    For hot read paths that unpack rows by position; only this cursor is affected,
+    so the shared connection keeps returning Row objects everywhere else.
+
+    Args:
+        conn: The database connection to create the cursor on
+
+    Returns:
+        sqlite3.Cursor: Cursor with the default tuple row factory
+    """
+    cursor = conn.cursor()
+    cursor.row_factory = None
+    return cursor
+
+
+@contextmanager
+def write_txn() -> Iterator[sqlite3.Connection]:
+    """
+    Run a block of writes as one transaction, serialized with other writers.
+    Takes the process-wide write lock, starts a BEGIN IMMEDIATE transaction,
+    and commits when the block finishes (or rolls back and re-raises on error).
+
+    Nested blocks join the enclosing transaction on this thread's connection
+    under a SAVEPOINT: an error rolls back just the nested block and re-raises,
+    and the outermost block does the commit. Write functions called inside a
+    write_txn() block re-raise their errors instead of returning a failure value
+    (see in_write_txn()), so a batch either commits as a whole or not at all.
+
+    Usage:
+        with write_txn():
+            mark_habit_complete(1, user_id, today)
+            mark_habit_complete(2, user_id, today)
+
+    Yields:
+        sqlite3.Connection: Connection with an open write transaction
+    """
+    conn = get_db_connection()
+    if conn.in_transaction:
+        # Already inside this thread's write_txn(), which holds the write lock
+        conn.execute("SAVEPOINT write_txn")
+        try:
+            yield conn
+            conn.execute("RELEASE write_txn")
+        except BaseException:
+            # SQLite may already have rolled back the whole transaction (e.g. disk full)
+            if conn.in_transaction:
+                conn.execute("ROLLBACK TO write_txn")
+                conn.execute("RELEASE write_txn")
+            raise
+        return
+
+    with _write_lock:
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            yield conn
+            if not conn.in_transaction:
+                # SQLite rolled the transaction back on an error the block swallowed
+                raise sqlite3.OperationalError("write transaction was rolled back before commit")
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+
+def in_write_txn() -> bool:
+    """
+    Check whether this thread is inside a write_txn() block.
+    Write functions check this before writing: when joining a caller's batch they
+    re-raise errors rather than returning a failure value, so the batch rolls back.
+
+    Returns:
+        True if a write transaction is open on this thread's connection
+    """
+    return get_db_connection().in_transaction
+
+
 def init_db() -> None:
     """
     Initialize the database schema.
     Creates the users, habits and habit_events tables if they don't exist.
+    Runs as one write transaction, so concurrent writers (e.g. other workers starting up)
+    can't land between the schema checks and the backfills that depend on them.
+    Errors propagate: a partially initialized schema must not be left behind.
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    with write_txn() as conn:
+        cursor = conn.cursor()
 
-    try:
         # Create users table
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 user_id INTEGER PRIMARY KEY AUTOINCREMENT,
                 username TEXT NOT NULL UNIQUE,
                 password_hash TEXT NOT NULL,
-                date_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+                date_created TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                data_version INTEGER NOT NULL DEFAULT 0
             )
         """)
 
+        # data_version was added after the first release; add it to older databases
+        cursor.execute("SELECT 1 FROM pragma_table_info('users') WHERE name = 'data_version'")
+        if cursor.fetchone() is None:
+            cursor.execute("ALTER TABLE users ADD COLUMN data_version INTEGER NOT NULL DEFAULT 0")
+
         # Create habits table (with user_id foreign key)
         cursor.execute("""
             CREATE TABLE IF NOT EXISTS habits (
@@ -63,23 +190,126 @@ def init_db() -> None:
             )
         """)
 
-        conn.commit()
-        print("Database initialized successfully with user authentication")
+        # Log the habit lifecycle events from the habits table itself, so creating or
+        # deleting a habit is one statement and the event is written in the same transaction
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_habits_after_insert
+            AFTER INSERT ON habits
+            BEGIN
+                INSERT INTO habit_events (habit_id, log_date, event_type)
+                VALUES (NEW.habit_id, NULL, 'habit_created');
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_habits_before_delete
+            BEFORE DELETE ON habits
+            BEGIN
+                INSERT INTO habit_events (habit_id, log_date, event_type)
+                VALUES (OLD.habit_id, NULL, 'habit_deleted');
+            END
+        """)
 
-    except sqlite3.Error as e:
-        print(f"Error initializing database: {e}")
-        conn.rollback()
+        # Bump the owner's data_version on anything the home page shows: every event
+        # (marks, and habit creation/deletion via the triggers above) and every rename
+        # or reorder. The page cache key reads it with a primary-key lookup.
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_habit_events_user_version
+            AFTER INSERT ON habit_events
+            BEGIN
+                UPDATE users SET data_version = data_version + 1
+                WHERE user_id = (SELECT user_id FROM habits WHERE habit_id = NEW.habit_id);
+            END
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_habits_user_version
+            AFTER UPDATE OF habit_name, display_order ON habits
+            BEGIN
+                UPDATE users SET data_version = data_version + 1
+                WHERE user_id = NEW.user_id;
+            END
+        """)
 
-    finally:
+        # Current completion status per (habit, date), derived from habit_events.
+        # The trigger keeps it in step with every logged mark event, so lookups read
+        # one row instead of searching the event log for the latest event.
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'habit_day_status'")
+        day_status_missing = cursor.fetchone() is None
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS habit_day_status (
+                habit_id INTEGER NOT NULL,
+                log_date TEXT NOT NULL,
+                is_complete INTEGER NOT NULL,
+                PRIMARY KEY (habit_id, log_date)
+            ) WITHOUT ROWID
+        """)
+        cursor.execute("""
+            CREATE TRIGGER IF NOT EXISTS trg_habit_events_day_status
+            AFTER INSERT ON habit_events
+            WHEN NEW.log_date IS NOT NULL
+            BEGIN
+                INSERT INTO habit_day_status (habit_id, log_date, is_complete)
+                VALUES (NEW.habit_id, NEW.log_date, NEW.event_type = 'mark_complete')
+                ON CONFLICT (habit_id, log_date) DO UPDATE SET is_complete = excluded.is_complete;
+            END
+        """)
+        if day_status_missing:
+            cursor.execute("""
+                INSERT INTO habit_day_status (habit_id, log_date, is_complete)
+                SELECT e.habit_id, e.log_date, e.event_type = 'mark_complete'
+                FROM habit_events e
+                JOIN (
+                    SELECT MAX(event_id) AS max_event_id
+                    FROM habit_events
+                    WHERE log_date IS NOT NULL
+                    GROUP BY habit_id, log_date
+                ) latest ON e.event_id = latest.max_event_id
+            """)
+
+        # Indexes for the per-habit date lookups and per-user habit listing
+        # (users.username is already indexed by its UNIQUE constraint).
+        # The events index covers "latest event per (habit, date)" queries: rows come out
+        # already in event_id DESC order and event_type is read from the index itself.
+        # It replaces the older (habit_id, log_date) index, which is now a redundant prefix:
+        # the habit_id + log_date range scans search this index as covering (EXPLAIN QUERY PLAN),
+        # and the per-day count/status lookups use habit_day_status's primary key instead.
+        cursor.execute("DROP INDEX IF EXISTS idx_events_habit_date")
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'index' AND name = 'idx_events_habit_date_evid'")
+        events_index_missing = cursor.fetchone() is None
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_events_habit_date_evid
+            ON habit_events(habit_id, log_date, event_id DESC, event_type)
+        """)
+        cursor.execute("""
+            CREATE INDEX IF NOT EXISTS idx_habits_user_order
+            ON habits(user_id, display_order)
+        """)
+
+        # Refresh planner statistics after (re)building the events index
+        if events_index_missing:
+            cursor.execute("ANALYZE")
+
+    print("Database initialized successfully with user authentication")
+
+
+def close_db() -> None:
+    """
+    Close this thread's connection, if one is open (e.g. at the end of a script).
+    The next get_db_connection() call opens a fresh one.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None:
         conn.close()
+        _local.conn = None
 
 
-def close_db(conn: sqlite3.Connection) -> None:
+def reset_request_db(exception: Optional[BaseException] = None) -> None:
     """
-    Close the database connection.
+    Roll back any transaction a request left open, keeping the connection for reuse.
+    Registered with app.teardown_appcontext.
 
     Args:
-        conn: The database connection to close
+        exception: The exception that ended the request, if any
     """
-    if conn:
-        conn.close()
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
@@ -0,0 +1,13 @@
+"""
+Gunicorn settings for running Century Tracker in production.
+Gunicorn picks this file up automatically: `gunicorn app:app`
+"""
+import multiprocessing
+
+
+bind = '127.0.0.1:5001'
+
+# Threaded workers: password hashing releases the GIL, so logins can overlap
+worker_class = 'gthread'
+workers = multiprocessing.cpu_count() * 2 + 1
+threads = 4
@@ -2,10 +2,33 @@
 Core business logic for Century Tracker habit tracking.
 Implements habit management, event logging, and statistics queries.
 """
-from datetime import date, datetime
-from typing import Optional, List, Dict
+from datetime import date, datetime, timedelta
+from typing import Optional, List, Dict, Tuple
+import logging
 import sqlite3
-from database import get_db_connection
+import threading
+import time
+from collections import OrderedDict
+import numpy as np
+from database import get_db_connection, get_tuple_cursor, in_write_txn, write_txn
+
+log = logging.getLogger(__name__)
+
+# Process-local cache for get_habit_by_id: habit_id -> (expiry time, row). Entries are
+# dropped when this process renames, reorders or deletes the habit; the TTL bounds how
+# long a change made by another worker process can go unseen. Habits never change owner.
+# Request threads share it, so every access goes through _habit_cache_lock.
+_HABIT_CACHE_TTL = 10.0
+_HABIT_CACHE_MAX = 1024
+_habit_cache: 'OrderedDict[int, Tuple[float, sqlite3.Row]]' = OrderedDict()
+_habit_cache_lock = threading.Lock()
+
+
+def _invalidate_habits(habit_ids: List[int]) -> None:
+    """Drop the given habits from the get_habit_by_id cache."""
+    with _habit_cache_lock:
+        for habit_id in habit_ids:
+            _habit_cache.pop(habit_id, None)
 
 
 # ==================== Habit Management ====================
@@ -13,6 +36,7 @@ from database import get_db_connection
 def create_habit(user_id: int, name: str, display_order: Optional[int] = None) -> Optional[int]:
     """
     Create a new habit for a specific user.
+    The 'habit_created' event is logged by a trigger on habits (see database.init_db).
 
     Args:
         user_id: The ID of the user creating the habit
@@ -22,36 +46,27 @@ def create_habit(user_id: int, name: str, display_order: Optional[int] = None) -
     Returns:
         habit_id of the created habit, or None if creation failed
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
+    joined = in_write_txn()
     try:
-        cursor.execute(
-            "INSERT INTO habits (user_id, habit_name, display_order) VALUES (?, ?, ?)",
-            (user_id, name, display_order)
-        )
-        habit_id = cursor.lastrowid
-
-        # Log habit creation event
-        cursor.execute("""
-            INSERT INTO habit_events (habit_id, log_date, event_type)
-            VALUES (?, NULL, 'habit_created')
-        """, (habit_id,))
+        with write_txn() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                "INSERT INTO habits (user_id, habit_name, display_order) VALUES (?, ?, ?)",
+                (user_id, name, display_order)
+            )
+            habit_id = cursor.lastrowid
 
-        conn.commit()
-        print(f"Created habit '{name}' with ID {habit_id} for user {user_id}")
+        log.debug("Created habit %r with ID %s for user %s", name, habit_id, user_id)
         return habit_id
 
     except sqlite3.Error as e:
-        print(f"Error creating habit: {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.error("Error creating habit: %s", e)
         return None
 
-    finally:
-        conn.close()
 
-
-def get_all_habits(user_id: int) -> List[Dict]:
+def get_all_habits(user_id: int) -> List[sqlite3.Row]:
     """
     Get all habits for a specific user ordered by display_order.
 
@@ -59,7 +74,8 @@ def get_all_habits(user_id: int) -> List[Dict]:
         user_id: The ID of the user whose habits to fetch
 
     Returns:
-        List of habit dictionaries with keys: habit_id, habit_name, date_created, display_order
+        List of habit rows (sqlite3.Row, indexable by column name) with keys:
+        habit_id, habit_name, date_created, display_order
     """
     conn = get_db_connection()
     cursor = conn.cursor()
@@ -71,83 +87,90 @@ def get_all_habits(user_id: int) -> List[Dict]:
             WHERE user_id = ?
             ORDER BY display_order, habit_id
         """, (user_id,))
-        rows = cursor.fetchall()
-        habits = [dict(row) for row in rows]
-        return habits
+        return cursor.fetchall()
 
     except sqlite3.Error as e:
-        print(f"Error fetching habits: {e}")
+        log.error("Error fetching habits: %s", e)
         return []
 
-    finally:
-        conn.close()
-
 
-def get_habit_by_id(habit_id: int) -> Optional[Dict]:
+def get_habit_by_id(habit_id: int) -> Optional[sqlite3.Row]:
     """
     Get a single habit by its ID.
+    Found habits are served from a small in-process cache for up to _HABIT_CACHE_TTL seconds.
 
     Args:
         habit_id: The ID of the habit to fetch
 
     Returns:
-        Habit dictionary or None if not found
+        Habit row (sqlite3.Row with habit_id, user_id, habit_name, date_created,
+        display_order) or None if not found
     """
+    now = time.monotonic()
+    with _habit_cache_lock:
+        cached = _habit_cache.get(habit_id)
+    if cached is not None and cached[0] > now:
+        return cached[1]
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
         cursor.execute("""
-            SELECT habit_id, habit_name, date_created, display_order
+            SELECT habit_id, user_id, habit_name, date_created, display_order
             FROM habits
             WHERE habit_id = ?
         """, (habit_id,))
         row = cursor.fetchone()
-        return dict(row) if row else None
+
+        # Only found habits are cached, so a new habit is never hidden behind a cached miss
+        if row is not None:
+            with _habit_cache_lock:
+                _habit_cache[habit_id] = (now + _HABIT_CACHE_TTL, row)
+                _habit_cache.move_to_end(habit_id)
+                if len(_habit_cache) > _HABIT_CACHE_MAX:
+                    _habit_cache.popitem(last=False)
+        return row
 
     except sqlite3.Error as e:
-        print(f"Error fetching habit: {e}")
+        log.error("Error fetching habit: %s", e)
         return None
 
-    finally:
-        conn.close()
 
-
-def rename_habit(habit_id: int, new_name: str) -> bool:
+def rename_habit(habit_id: int, user_id: int, new_name: str) -> bool:
     """
-    Rename a habit.
+    Rename a habit, if it belongs to the given user.
 
     Args:
         habit_id: The ID of the habit to rename
+        user_id: The ID of the user who must own the habit
         new_name: The new name for the habit
 
     Returns:
-        True if renamed successfully, False otherwise
+        True if renamed successfully, False otherwise (including if the user doesn't own it)
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
+    joined = in_write_txn()
     try:
-        cursor.execute("""
-            UPDATE habits
-            SET habit_name = ?
-            WHERE habit_id = ?
-        """, (new_name, habit_id))
+        with write_txn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("""
+                UPDATE habits
+                SET habit_name = ?
+                WHERE habit_id = ? AND user_id = ?
+            """, (new_name, habit_id, user_id))
 
-        conn.commit()
         updated = cursor.rowcount > 0
         if updated:
-            print(f"Renamed habit {habit_id} to '{new_name}'")
+            _invalidate_habits([habit_id])
+            log.debug("Renamed habit %s to %r", habit_id, new_name)
         return updated
 
     except sqlite3.Error as e:
-        print(f"Error renaming habit: {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.error("Error renaming habit: %s", e)
         return False
 
-    finally:
-        conn.close()
-
 
 def update_habit_order(habit_ids: List[int]) -> bool:
     """
@@ -159,145 +182,210 @@ def update_habit_order(habit_ids: List[int]) -> bool:
     Returns:
         True if updated successfully, False otherwise
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
+    joined = in_write_txn()
     try:
-        # Update display_order for each habit based on position in list
-        for index, habit_id in enumerate(habit_ids):
-            cursor.execute("""
-                UPDATE habits
-                SET display_order = ?
-                WHERE habit_id = ?
-            """, (index, habit_id))
-
-        conn.commit()
-        print(f"Updated order for {len(habit_ids)} habits")
+        with write_txn() as conn:
+            cursor = conn.cursor()
+
+            # Update display_order for each habit based on position in list
+            for index, habit_id in enumerate(habit_ids):
+                cursor.execute("""
+                    UPDATE habits
+                    SET display_order = ?
+                    WHERE habit_id = ?
+                """, (index, habit_id))
+
+        _invalidate_habits(habit_ids)
+        log.debug("Updated order for %s habits", len(habit_ids))
         return True
 
     except sqlite3.Error as e:
-        print(f"Error updating habit order: {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.error("Error updating habit order: %s", e)
         return False
 
-    finally:
-        conn.close()
-
 
-def delete_habit(habit_id: int) -> bool:
+def delete_habit(habit_id: int, user_id: int) -> bool:
     """
-    Delete a habit and log deletion event. Historical event data is preserved.
+    Delete a habit and log deletion event, if it belongs to the given user.
+    The 'habit_deleted' event is logged by a trigger on habits (see database.init_db),
+    in the same transaction as the delete. Historical event data is preserved.
 
     Args:
         habit_id: The ID of the habit to delete
+        user_id: The ID of the user who must own the habit
 
     Returns:
-        True if deleted successfully, False otherwise
+        True if deleted successfully, False otherwise (including if the user doesn't own it)
     """
-    conn = get_db_connection()
-    cursor = conn.cursor()
-
+    joined = in_write_txn()
     try:
-        # Log deletion event BEFORE deleting habit
-        cursor.execute("""
-            INSERT INTO habit_events (habit_id, log_date, event_type)
-            VALUES (?, NULL, 'habit_deleted')
-        """, (habit_id,))
+        with write_txn() as conn:
+            cursor = conn.cursor()
+            cursor.execute("DELETE FROM habits WHERE habit_id = ? AND user_id = ?", (habit_id, user_id))
 
-        # Delete habit from table
-        cursor.execute("DELETE FROM habits WHERE habit_id = ?", (habit_id,))
-
-        conn.commit()
         deleted = cursor.rowcount > 0
         if deleted:
-            print(f"Deleted habit with ID {habit_id}")
+            _invalidate_habits([habit_id])
+            log.debug("Deleted habit with ID %s", habit_id)
         return deleted
 
     except sqlite3.Error as e:
-        print(f"Error deleting habit: {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.error("Error deleting habit: %s", e)
         return False
 
-    finally:
-        conn.close()
-
 
 # ==================== Event Logging ====================
 
-def mark_habit_complete(habit_id: int, log_date: Optional[date] = None) -> bool:
+def mark_habit_complete(habit_id: int, user_id: int, log_date: Optional[date] = None) -> bool:
     """
     Mark a habit as complete for a given date.
     Inserts a 'mark_complete' event.
+    Commits as a WAL append without a per-commit fsync (see database._connect),
+    or joins the enclosing transaction when called inside a write_txn() block.
 
     Args:
         habit_id: The ID of the habit
+        user_id: The ID of the user who must own the habit
         log_date: The date to mark (defaults to today)
 
     Returns:
-        True if event logged successfully, False otherwise
+        True if event logged successfully, False otherwise (including if the user doesn't own it)
     """
     if log_date is None:
         log_date = date.today()
 
-    log_date_str = log_date.strftime('%Y-%m-%d')
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    log_date_str = log_date.isoformat()
 
+    joined = in_write_txn()
     try:
-        cursor.execute("""
-            INSERT INTO habit_events (habit_id, log_date, event_type)
-            VALUES (?, ?, 'mark_complete')
-        """, (habit_id, log_date_str))
-        conn.commit()
-        print(f"Marked habit {habit_id} complete for {log_date_str}")
-        return True
+        with write_txn() as conn:
+            cursor = conn.cursor()
+
+            # Only insert if the user owns the habit
+            cursor.execute("""
+                INSERT INTO habit_events (habit_id, log_date, event_type)
+                SELECT ?, ?, 'mark_complete'
+                WHERE EXISTS (SELECT 1 FROM habits WHERE habit_id = ? AND user_id = ?)
+            """, (habit_id, log_date_str, habit_id, user_id))
+
+        logged = cursor.rowcount > 0
+        if logged:
+            log.debug("Marked habit %s complete for %s", habit_id, log_date_str)
+        return logged
 
     except sqlite3.Error as e:
-        print(f"Error logging completion: {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.error("Error logging completion: %s", e)
         return False
 
-    finally:
-        conn.close()
-
 
-def mark_habit_incomplete(habit_id: int, log_date: Optional[date] = None) -> bool:
+def mark_habit_incomplete(habit_id: int, user_id: int, log_date: Optional[date] = None) -> bool:
     """
     Mark a habit as incomplete for a given date.
     Inserts a 'mark_incomplete' event (for toggling off).
+    Commits as a WAL append without a per-commit fsync (see database._connect),
+    or joins the enclosing transaction when called inside a write_txn() block.
 
     Args:
         habit_id: The ID of the habit
+        user_id: The ID of the user who must own the habit
         log_date: The date to mark (defaults to today)
 
     Returns:
-        True if event logged successfully, False otherwise
+        True if event logged successfully, False otherwise (including if the user doesn't own it)
     """
     if log_date is None:
         log_date = date.today()
 
-    log_date_str = log_date.strftime('%Y-%m-%d')
-
-    conn = get_db_connection()
-    cursor = conn.cursor()
+    log_date_str = log_date.isoformat()
 
+    joined = in_write_txn()
     try:
-        cursor.execute("""
-            INSERT INTO habit_events (habit_id, log_date, event_type)
-            VALUES (?, ?, 'mark_incomplete')
-        """, (habit_id, log_date_str))
-        conn.commit()
-        print(f"Marked habit {habit_id} incomplete for {log_date_str}")
-        return True
+        with write_txn() as conn:
+            cursor = conn.cursor()
+
+            # Only insert if the user owns the habit
+            cursor.execute("""
+                INSERT INTO habit_events (habit_id, log_date, event_type)
+                SELECT ?, ?, 'mark_incomplete'
+                WHERE EXISTS (SELECT 1 FROM habits WHERE habit_id = ? AND user_id = ?)
+            """, (habit_id, log_date_str, habit_id, user_id))
+
+        logged = cursor.rowcount > 0
+        if logged:
+            log.debug("Marked habit %s incomplete for %s", habit_id, log_date_str)
+        return logged
 
     except sqlite3.Error as e:
-        print(f"Error logging incompletion: {e}")
-        conn.rollback()
+        if joined:
+            raise
+        log.error("Error logging incompletion: %s", e)
         return False
 
-    finally:
-        conn.close()
+
+def mark_habits_complete(user_id: int, updates: List[Tuple[int, date]]) -> int:
+    """
+    Mark several (habit, date) pairs as complete in one transaction.
+    Batch version of mark_habit_complete: one statement, one commit.
+
+    Args:
+        user_id: The ID of the user who must own the habits
+        updates: List of (habit_id, log_date) pairs
+
+    Returns:
+        Number of events logged (pairs for habits the user doesn't own are skipped)
+    """
+    return _log_habit_events(user_id, updates, 'mark_complete')
+
+
+def mark_habits_incomplete(user_id: int, updates: List[Tuple[int, date]]) -> int:
+    """
+    Mark several (habit, date) pairs as incomplete in one transaction.
+    Batch version of mark_habit_incomplete: one statement, one commit.
+
+    Args:
+        user_id: The ID of the user who must own the habits
+        updates: List of (habit_id, log_date) pairs
+
+    Returns:
+        Number of events logged (pairs for habits the user doesn't own are skipped)
+    """
+    return _log_habit_events(user_id, updates, 'mark_incomplete')
+
+
+def _log_habit_events(user_id: int, updates: List[Tuple[int, date]], event_type: str) -> int:
+    """Insert one event_type event per (habit_id, log_date) pair with a single executemany."""
+    rows = [
+        (habit_id, log_date, event_type, habit_id, user_id)
+        for habit_id, log_date in updates
+    ]
+
+    joined = in_write_txn()
+    try:
+        with write_txn() as conn:
+            cursor = conn.cursor()
+
+            # Only insert events for habits the user owns
+            cursor.executemany("""
+                INSERT INTO habit_events (habit_id, log_date, event_type)
+                SELECT ?, ?, ?
+                WHERE EXISTS (SELECT 1 FROM habits WHERE habit_id = ? AND user_id = ?)
+            """, rows)
+
+        logged = cursor.rowcount
+        log.debug("Logged %s %r events for user %s", logged, event_type, user_id)
+        return logged
+
+    except sqlite3.Error as e:
+        if joined:
+            raise
+        log.error("Error logging %s events: %s", event_type, e)
+        return 0
 
 
 # ==================== Statistics and Queries ====================
@@ -305,7 +393,7 @@ def mark_habit_incomplete(habit_id: int, log_date: Optional[date] = None) -> boo
 def get_habit_100day_count(habit_id: int, end_date: Optional[date] = None) -> int:
     """
     Get the count of completed days in the rolling 100-day window.
-    Uses the event-based system to determine current state.
+    Reads the per-day status maintained from the event log (habit_day_status).
 
     Args:
         habit_id: The ID of the habit
@@ -317,76 +405,62 @@ def get_habit_100day_count(habit_id: int, end_date: Optional[date] = None) -> in
     if end_date is None:
         end_date = date.today()
 
-    end_date_str = end_date.strftime('%Y-%m-%d')
+    # The window is deliberately not clipped to habits.date_created: days before a habit
+    # was created can be back-filled from the detail page, and the primary-key range seek
+    # only reads days that have a status row, so a young habit's empty days cost nothing
+    start_date_str = (end_date - timedelta(days=99)).isoformat()
+    end_date_str = end_date.isoformat()
 
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = get_tuple_cursor(conn)
 
     try:
-        # Query using window function to get most recent event per date
         query = """
-            WITH latest_events AS (
-                SELECT
-                    habit_id,
-                    log_date,
-                    event_type,
-                    ROW_NUMBER() OVER (
-                        PARTITION BY habit_id, log_date
-                        ORDER BY event_id DESC
-                    ) as rn
-                FROM habit_events
-                WHERE habit_id = ?
-                  AND log_date >= date(?, '-99 days')
-                  AND log_date <= ?
-            )
-            SELECT COUNT(*) as days_completed
-            FROM latest_events
-            WHERE rn = 1 AND event_type = 'mark_complete'
+            SELECT COALESCE(SUM(is_complete), 0) as days_completed
+            FROM habit_day_status
+            WHERE habit_id = ?
+              AND log_date >= ?
+              AND log_date <= ?
         """
 
-        cursor.execute(query, (habit_id, end_date_str, end_date_str))
+        cursor.execute(query, (habit_id, start_date_str, end_date_str))
         result = cursor.fetchone()
-        return result['days_completed'] if result else 0
+        return result[0] if result else 0
 
     except sqlite3.Error as e:
-        print(f"Error calculating 100-day count: {e}")
+        log.error("Error calculating 100-day count: %s", e)
         return 0
 
-    finally:
-        conn.close()
-
 
-def get_habit_stats_all(user_id: int) -> List[Dict]:
+def get_habit_stats(habit_id: int, user_id: int, end_date: Optional[date] = None) -> Optional[Dict]:
     """
-    Get 100-day completion counts for all habits belonging to a user.
-    Ordered by display_order for homepage display.
+    Get the 100-day completion count for a single habit owned by a user.
 
     Args:
-        user_id: The ID of the user whose stats to fetch
+        habit_id: The ID of the habit
+        user_id: The ID of the user who must own the habit
+        end_date: The end date of the window (defaults to today)
 
     Returns:
-        List of dictionaries with keys: habit_id, habit_name, count, display_order
+        Dictionary with keys: habit_id, habit_name, count, display_order,
+        or None if the habit doesn't exist or belongs to another user
     """
-    habits = get_all_habits(user_id)
-    stats = []
-
-    for habit in habits:
-        habit_id = habit['habit_id']
-        count = get_habit_100day_count(habit_id)
-        stats.append({
-            'habit_id': habit_id,
-            'habit_name': habit['habit_name'],
-            'count': count,
-            'display_order': habit['display_order']
-        })
+    habit = get_habit_by_id(habit_id)
+    if not habit or habit['user_id'] != user_id:
+        return None
 
-    return stats
+    return {
+        'habit_id': habit_id,
+        'habit_name': habit['habit_name'],
+        'count': get_habit_100day_count(habit_id, end_date),
+        'display_order': habit['display_order']
+    }
 
 
 def get_habit_date_status(habit_id: int, log_date: date) -> bool:
     """
     Check if a habit was completed on a specific date.
-    Queries the most recent event for that date.
+    Reads the status of the most recent event for that date from habit_day_status.
 
     Args:
         habit_id: The ID of the habit
@@ -395,59 +469,183 @@ def get_habit_date_status(habit_id: int, log_date: date) -> bool:
     Returns:
         True if completed, False otherwise
     """
-    log_date_str = log_date.strftime('%Y-%m-%d')
+    log_date_str = log_date.isoformat()
 
     conn = get_db_connection()
-    cursor = conn.cursor()
+    cursor = get_tuple_cursor(conn)
 
     try:
         query = """
-            SELECT event_type
-            FROM habit_events
+            SELECT is_complete
+            FROM habit_day_status
             WHERE habit_id = ? AND log_date = ?
-            ORDER BY event_id DESC
-            LIMIT 1
         """
 
         cursor.execute(query, (habit_id, log_date_str))
         result = cursor.fetchone()
 
         if result:
-            return result['event_type'] == 'mark_complete'
+            return bool(result[0])
         return False
 
     except sqlite3.Error as e:
-        print(f"Error checking date status: {e}")
+        log.error("Error checking date status: %s", e)
         return False
 
-    finally:
-        conn.close()
 
-
-def get_habit_100day_history(habit_id: int, end_date: Optional[date] = None) -> List[bool]:
+def get_habit_100day_history(habit_id: int, end_date: Optional[date] = None) -> int:
     """
-    Get completion status for each of the last 100 days in reverse chronological order.
-    Index 0 = today (or end_date), Index 1 = yesterday, etc.
+    Get completion status for each of the last 100 days, packed into an int bitmask.
+    Bit 0 = today (or end_date), bit 1 = yesterday, etc. A set bit means completed.
 
     Args:
         habit_id: The ID of the habit
         end_date: The end date of the window (defaults to today)
 
     Returns:
-        List of 100 booleans indicating completion status, newest first
+        Bitmask of the 100-day history (read individual days with day_complete())
+    """
+    if end_date is None:
+        end_date = date.today()
+
+    start_date_str = (end_date - timedelta(days=99)).isoformat()
+    end_date_str = end_date.isoformat()
+    mask = 0
+
+    conn = get_db_connection()
+    cursor = get_tuple_cursor(conn)
+
+    try:
+        # One range scan over the per-day status for the whole window
+        cursor.execute("""
+            SELECT log_date
+            FROM habit_day_status
+            WHERE habit_id = ?
+              AND log_date >= ?
+              AND log_date <= ?
+              AND is_complete = 1
+        """, (habit_id, start_date_str, end_date_str))
+
+        for (log_date_str,) in cursor:
+            mask |= 1 << (end_date - date.fromisoformat(log_date_str)).days
+
+        return mask
+
+    except sqlite3.Error as e:
+        log.error("Error fetching 100-day history: %s", e)
+        return mask
+
+
+def day_complete(mask: int, days_ago: int) -> bool:
+    """
+    Check one day of a history bitmask.
+
+    Args:
+        mask: History bitmask (bit 0 = end_date)
+        days_ago: Days before end_date to check
+
+    Returns:
+        True if the habit was completed that day
+    """
+    return bool((mask >> days_ago) & 1)
+
+
+def format_history(mask: int, days: int = 100) -> str:
+    """
+    Render a history bitmask as a string of '0'/'1' characters for JSON responses.
+    Character i is day i (index 0 = end_date), matching the bit order.
+
+    Args:
+        mask: History bitmask (bit 0 = end_date)
+        days: Number of days to render
+
+    Returns:
+        String of `days` '0'/'1' characters, newest first
+    """
+    return format(mask, f'0{days}b')[::-1]
+
+
+def get_homepage_snapshot(user_id: int, end_date: Optional[date] = None) -> List[Dict]:
+    """
+    Get everything the homepage shows for each of a user's habits in one query:
+    the 100-day count and the daily history bitmask (bit 0 = end_date, see day_complete()).
+    Ordered by display_order for homepage display.
+
+    Args:
+        user_id: The ID of the user whose habits to fetch
+        end_date: The end date of the window (defaults to today)
+
+    Returns:
+        List of dictionaries with keys: habit_id, habit_name, display_order, count, history_mask
     """
     if end_date is None:
         end_date = date.today()
 
-    from datetime import timedelta
+    start_date_str = (end_date - timedelta(days=99)).isoformat()
+    end_date_str = end_date.isoformat()
+
+    conn = get_db_connection()
+    cursor = get_tuple_cursor(conn)
+
+    try:
+        # One row per completed day in the window (or one row with a NULL date for habits
+        # with none), grouped together per habit by the ORDER BY
+        cursor.execute("""
+            SELECT h.habit_id, h.habit_name, h.display_order, s.log_date
+            FROM habits h
+            LEFT JOIN habit_day_status s
+              ON s.habit_id = h.habit_id
+             AND s.log_date >= ?
+             AND s.log_date <= ?
+             AND s.is_complete = 1
+            WHERE h.user_id = ?
+            ORDER BY h.display_order, h.habit_id
+        """, (start_date_str, end_date_str, user_id))
+
+        habits = []
+        habit = None
+        for habit_id, habit_name, display_order, log_date_str in cursor:
+            if habit is None or habit['habit_id'] != habit_id:
+                habit = {'habit_id': habit_id, 'habit_name': habit_name,
+                         'display_order': display_order, 'history_mask': 0}
+                habits.append(habit)
+            if log_date_str is not None:
+                habit['history_mask'] |= 1 << (end_date - date.fromisoformat(log_date_str)).days
+
+        for habit in habits:
+            habit['count'] = habit['history_mask'].bit_count()
+        return habits
+
+    except sqlite3.Error as e:
+        log.error("Error fetching homepage snapshot: %s", e)
+        return []
+
+
+def get_habits_version(user_id: int) -> str:
+    """
+    Get a cheap version stamp of everything the home page shows for a user.
+    Reads users.data_version, which triggers bump whenever one of their habits
+    gets a new event or is added, deleted, renamed or reordered (see database.init_db),
+    so it can be used as a cache key at the cost of one primary-key lookup.
+
+    Args:
+        user_id: The ID of the user
+
+    Returns:
+        Version string
+    """
+    conn = get_db_connection()
+    cursor = get_tuple_cursor(conn)
 
-    history = []
-    for days_ago in range(100):
-        check_date = end_date - timedelta(days=days_ago)
-        is_complete = get_habit_date_status(habit_id, check_date)
-        history.append(is_complete)
+    try:
+        cursor.execute("SELECT data_version FROM users WHERE user_id = ?", (user_id,))
+        result = cursor.fetchone()
+        return str(result[0]) if result else 'none'
 
-    return history
+    except sqlite3.Error as e:
+        log.error("Error fetching habits version: %s", e)
+        # Unique value so a failed lookup never matches a cached page
+        return f"error:{datetime.now().timestamp()}"
 
 
 def get_habit_trend_data(habit_id: int, end_date: Optional[date] = None, days: int = 100) -> List[int]:
@@ -466,47 +664,65 @@ def get_habit_trend_data(habit_id: int, end_date: Optional[date] = None, days: i
     if end_date is None:
         end_date = date.today()
 
-    from datetime import timedelta
+    # The oldest trend point needs the 99 days before it, so fetch days + 99 days at once
+    window = 100
+    span = days + window - 1
+    start_date = end_date - timedelta(days=span - 1)
 
-    trend = []
-    for days_ago in range(days):
-        check_date = end_date - timedelta(days=days_ago)
-        count = get_habit_100day_count(habit_id, check_date)
-        trend.append(count)
+    conn = get_db_connection()
+    cursor = get_tuple_cursor(conn)
 
-    return trend
+    try:
+        # Completed days in the span, from the same per-day status as the 100-day count
+        cursor.execute("""
+            SELECT log_date
+            FROM habit_day_status
+            WHERE habit_id = ?
+              AND log_date >= ?
+              AND log_date <= ?
+              AND is_complete = 1
+        """, (habit_id, start_date, end_date))
 
+        # Completion per day, oldest first
+        completed = np.zeros(span, dtype=np.int16)
+        completed[[(date.fromisoformat(log_date_str) - start_date).days
+                   for (log_date_str,) in cursor]] = 1
 
-def verify_habit_ownership(habit_id: int, user_id: int) -> bool:
+        # Rolling 100-day sum ending on each of the last `days` days
+        trend = np.convolve(completed, np.ones(window, dtype=np.int16), mode='valid')
+        return trend[::-1].tolist()
+
+    except sqlite3.Error as e:
+        log.error("Error calculating trend data: %s", e)
+        return [0] * days
+
+
+def verify_habits_ownership(habit_ids: List[int], user_id: int) -> bool:
     """
-    Verify that a habit belongs to a specific user.
-    Critical for preventing unauthorized access to other users' habits.
+    Verify that every habit in a list belongs to a specific user, in one query.
 
     Args:
-        habit_id: The ID of the habit to verify
+        habit_ids: The IDs of the habits to verify
         user_id: The ID of the user claiming ownership
 
     Returns:
-        True if the habit belongs to the user, False otherwise
+        True if all the habits belong to the user, False otherwise
     """
+    unique_ids = set(habit_ids)
+    placeholders = ','.join('?' * len(unique_ids))
+
     conn = get_db_connection()
     cursor = conn.cursor()
 
     try:
-        cursor.execute("""
-            SELECT user_id
+        cursor.execute(f"""
+            SELECT COUNT(*) AS owned
             FROM habits
-            WHERE habit_id = ?
-        """, (habit_id,))
+            WHERE user_id = ? AND habit_id IN ({placeholders})
+        """, (user_id, *unique_ids))
         result = cursor.fetchone()
-
-        if result:
-            return result['user_id'] == user_id
-        return False
+        return result['owned'] == len(unique_ids)
 
     except sqlite3.Error as e:
-        print(f"Error verifying habit ownership: {e}")
+        log.error("Error verifying habit ownership: %s", e)
         return False
-
-    finally:
-        conn.close()